@@ -2,16 +2,31 @@
 import json
 import sqlite3
 import datetime
+import threading
+import time
 import paho.mqtt.client as mqtt
 from init import (
-    MqttAuth,
+    MqttAuth, tank_topic, client_suffix,
     TOPIC_TEMP, TOPIC_WATER, TOPIC_ALERTS,
+    MAINT_INTERVAL_SEC, MAINT_QUIET_SEC, MAINT_STEP_BUDGET_SEC,
+    MAINT_VACUUM_PAGES, MAINT_ANALYZE_EVERY_SEC, MAINT_ANALYZE_LIMIT,
 )
 
 class AquariumDataManager:
-    def __init__(self, db_path="aquarium_data.db"):
+    def __init__(self, db_path="aquarium_data.db", tank_id=None):
         self.db_path = db_path
+        self.tank_id = tank_id
         self.auth = MqttAuth()
+        # this tank's topics (the plain ones for a single aquarium)
+        self.topic_temp = tank_topic(TOPIC_TEMP, tank_id)
+        self.topic_water = tank_topic(TOPIC_WATER, tank_id)
+        self.topic_alerts = tank_topic(TOPIC_ALERTS, tank_id)
+        self.stored = 0  # rows saved so far (read by fleet.py for throughput)
+        self.last_write = 0.0  # time.monotonic() of the last insert
+        self.last_analyze = None
+        self.maintenance_stats = {"runs": 0, "bytes_reclaimed": 0, "seconds": 0.0}
+        self._stop_maintenance = threading.Event()
+        self._maintenance_thread = None
         self.setup_database()
         
     def setup_database(self):
@@ -19,6 +34,13 @@ class AquariumDataManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Let maintenance give free pages back bit by bit. This only works
+        # on a new database - an old one needs a single full VACUUM first.
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        
+        # WAL lets readers (like query_server.py) run alongside the logger
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Table for sensor readings (temperature, water level)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS sensor_readings (
@@ -31,6 +53,12 @@ class AquariumDataManager:
             )
         ''')
         
+        # Range queries filter on time, so index it
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_readings_timestamp
+            ON sensor_readings (timestamp)
+        ''')
+        
         # Table for system alerts
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS alerts (
@@ -42,6 +70,8 @@ class AquariumDataManager:
         ''')
         
         conn.commit()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("[DATA LOGGER] Incremental vacuum is off - run VACUUM once to enable it")
         conn.close()
         print("[DATA LOGGER] Database ready")
         
@@ -62,6 +92,8 @@ class AquariumDataManager:
         
         conn.commit()
         conn.close()
+        self.stored += 1
+        self.last_write = time.monotonic()
         
     def store_alert(self, level, message):
         """Store alert to database"""
@@ -74,6 +106,8 @@ class AquariumDataManager:
         
         conn.commit()
         conn.close()
+        self.stored += 1
+        self.last_write = time.monotonic()
         print(f"[DATA] Alert stored: {level} - {message}")
         
     def get_recent_readings(self, limit=10):
@@ -108,14 +142,126 @@ class AquariumDataManager:
         conn.close()
         return results
 
+    # ---------- Maintenance ----------
+    def maintenance_connection(self):
+        """Connection for one maintenance step - SQLite interrupts it once
+        MAINT_STEP_BUDGET_SEC is used up so inserts never wait long"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=0)
+        deadline = time.monotonic() + MAINT_STEP_BUDGET_SEC
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        return conn, deadline
+
+    def checkpoint_wal(self):
+        """Copy the WAL back into the database without blocking the logger"""
+        conn, _ = self.maintenance_connection()
+        try:
+            busy, frames, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            return {"wal_frames": frames, "checkpointed": done}
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self):
+        """Give free pages back to the file system in small batches"""
+        conn, deadline = self.maintenance_connection()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return {"bytes_reclaimed": 0}
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            before = free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            while free and time.monotonic() < deadline:
+                try:
+                    # executescript runs the pragma to the end (execute stops after one page)
+                    conn.executescript(f"PRAGMA incremental_vacuum({MAINT_VACUUM_PAGES})")
+                except sqlite3.OperationalError:
+                    # out of time or busy - earlier batches are already committed
+                    conn.set_progress_handler(None, 0)
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    break
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return {"bytes_reclaimed": (before - free) * page_size}
+        finally:
+            conn.close()
+
+    def read_stats(self, conn):
+        """Current planner statistics, empty before the first ANALYZE"""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            return []
+        return conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1 ORDER BY tbl, idx").fetchall()
+
+    def analyze(self):
+        """Refresh query planner statistics every MAINT_ANALYZE_EVERY_SEC"""
+        now = time.monotonic()
+        if self.last_analyze is not None and now - self.last_analyze < MAINT_ANALYZE_EVERY_SEC:
+            return {"analyzed": False}
+        conn, _ = self.maintenance_connection()
+        try:
+            before = self.read_stats(conn)
+            # PRAGMA optimize leaves stale stats alone on a fresh connection,
+            # so sample every index again - analysis_limit keeps this cheap
+            conn.execute(f"PRAGMA analysis_limit={MAINT_ANALYZE_LIMIT}")
+            conn.execute("ANALYZE")
+            self.last_analyze = now
+            return {"analyzed": self.read_stats(conn) != before}
+        finally:
+            conn.close()
+
+    def wait_for_quiet(self):
+        """Waits for a gap between inserts, returns False if we are stopping"""
+        while time.monotonic() - self.last_write < MAINT_QUIET_SEC:
+            if self._stop_maintenance.wait(0.05):
+                return False
+        return not self._stop_maintenance.is_set()
+
+    def run_maintenance(self):
+        """Runs every maintenance step once and reports what it did and how
+        long each step took (waiting for a quiet moment doesn't count)"""
+        report = {}
+        step_seconds = {}
+        for step in (self.checkpoint_wal, self.incremental_vacuum, self.analyze):
+            if not self.wait_for_quiet():
+                break
+            start = time.monotonic()
+            try:
+                report.update(step())
+            except sqlite3.OperationalError as e:
+                # out of time or the database was busy - try again next round
+                report[step.__name__] = f"skipped ({e})"
+            step_seconds[step.__name__] = time.monotonic() - start
+        elapsed = sum(step_seconds.values())
+
+        self.maintenance_stats["runs"] += 1
+        self.maintenance_stats["bytes_reclaimed"] += report.get("bytes_reclaimed", 0)
+        self.maintenance_stats["seconds"] += elapsed
+        steps = ", ".join(f"{name} {sec * 1000:.1f} ms" for name, sec in step_seconds.items())
+        print(f"[DATA] Maintenance took {elapsed * 1000:.1f} ms ({steps}): {report}")
+        report["step_seconds"] = step_seconds
+        return report
+
+    def maintenance_loop(self):
+        while not self._stop_maintenance.wait(MAINT_INTERVAL_SEC):
+            self.run_maintenance()
+
+    def start_maintenance(self):
+        """Start the background maintenance scheduler"""
+        self._stop_maintenance.clear()
+        self._maintenance_thread = threading.Thread(target=self.maintenance_loop, daemon=True)
+        self._maintenance_thread.start()
+        return self._maintenance_thread
+
+    def stop_maintenance(self, timeout=1.0):
+        """Stop the scheduler and wait for a running step to finish.
+        Returns False if it was still busy after timeout seconds."""
+        self._stop_maintenance.set()
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.join(timeout)
+            if self._maintenance_thread.is_alive():
+                return False
+            self._maintenance_thread = None
+        return True
+
     # MQTT Callbacks
-    def on_connect(self, client, userdata, flags, rc):
-        print(f"[DATA] Connected to MQTT broker: {rc}")
-        client.subscribe([
-            (TOPIC_TEMP, 0),
-            (TOPIC_WATER, 0),
-            (TOPIC_ALERTS, 0),
-        ])
+    def topics(self):
+        return [self.topic_temp, self.topic_water, self.topic_alerts]
 
     def on_message(self, client, userdata, msg):
         try:
@@ -123,7 +269,7 @@ class AquariumDataManager:
         except Exception:
             return
 
-        if msg.topic == TOPIC_TEMP:
+        if msg.topic == self.topic_temp:
             # DHT sensor data (temperature + humidity)
             self.store_sensor_data(
                 sensor_type="DHT",
@@ -131,37 +277,74 @@ class AquariumDataManager:
                 humidity=data.get("humidity")
             )
             
-        elif msg.topic == TOPIC_WATER:
+        elif msg.topic == self.topic_water:
             # Water level sensor data
             self.store_sensor_data(
                 sensor_type="WATER_LEVEL",
                 water_level=data.get("level")
             )
             
-        elif msg.topic == TOPIC_ALERTS:
+        elif msg.topic == self.topic_alerts:
             # Store alerts for history tracking
             level = data.get("level", "INFO")
             message = data.get("msg", "")
             self.store_alert(level, message)
 
-    def start_collection(self):
+    def start_collection(self, stop=None):
         """Start MQTT data collection"""
-        client = mqtt.Client(
-            client_id="data_manager.smart_aquarium",
-            clean_session=True,
-            transport=self.auth.transport,
-            callback_api_version=mqtt.CallbackAPIVersion.VERSION1
-        )
-        
-        if self.auth.username:
-            client.username_pw_set(self.auth.username, self.auth.password)
-            
-        client.on_connect = self.on_connect
-        client.on_message = self.on_message
+        collect([self], stop=stop)
+
+# userdata maps every topic we listen to onto the data manager for that tank
+def on_connect(client, userdata, flags, rc):
+    print(f"[DATA] Connected to MQTT broker: {rc}")
+    client.subscribe([(topic, 0) for topic in userdata])
+
+def on_message(client, userdata, msg):
+    data_manager = userdata.get(msg.topic)
+    if data_manager is not None:
+        data_manager.on_message(client, userdata, msg)
+
+def collect(data_managers, stop=None):
+    """Feeds one or more data managers (one per tank) from a single MQTT
+    connection until Ctrl+C or until the stop event is set"""
+    auth = data_managers[0].auth
+    tank_ids = [dm.tank_id for dm in data_managers if dm.tank_id is not None]
+    stop = stop or threading.Event()
+    client = mqtt.Client(
+        client_id="data_manager.smart_aquarium" + client_suffix(tank_ids),
+        clean_session=True,
+        userdata={topic: dm for dm in data_managers for topic in dm.topics()},
+        transport=auth.transport,
+        callback_api_version=mqtt.CallbackAPIVersion.VERSION1
+    )
+    
+    if auth.username:
+        client.username_pw_set(auth.username, auth.password)
         
-        print(f"[DATA] Connecting to {self.auth.host}:{self.auth.port}")
-        client.connect(self.auth.host, self.auth.port, 60)
-        client.loop_forever()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    
+    print(f"[DATA] Connecting to {auth.host}:{auth.port}")
+    client.connect(auth.host, auth.port, 60)
+    for dm in data_managers:
+        dm.start_maintenance()
+    client.loop_start()
+    try:
+        while not stop.wait(0.5):
+            pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        for dm in data_managers:
+            dm.stop_maintenance(timeout=0)  # tell them all first so they wind down together
+        for dm in data_managers:
+            if not dm.stop_maintenance():
+                print(f"[DATA] Maintenance of {dm.db_path} still busy - skipping final checkpoint")
+                continue
+            try:
+                dm.checkpoint_wal()  # leave a tidy database behind
+            except sqlite3.OperationalError:
+                pass
 
 if __name__ == "__main__":
     data_manager = AquariumDataManager()
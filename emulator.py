@@ -1,121 +1,155 @@
 # Hardware emulator for my aquarium project - simulates sensors and equipment
-import json, time, random
+import json, time, random, math, threading
 import paho.mqtt.client as mqtt
 from init import (
-    MqttAuth,
+    MqttAuth, tank_topic, client_suffix,
     # topics
     TOPIC_TEMP, TOPIC_WATER,
     TOPIC_FEEDER, TOPIC_HEATER, TOPIC_COOLER, TOPIC_PUMP,
     # params
     MAX_FEED_SECONDS, DEFAULT_TARGET_TEMP,
-    MIN_SAFE_WATER, EVAP_RATE_PER_STEP,
-    REFILL_RATE_PER_STEP, DEFAULT_REFILL_TARGET,
+    MIN_SAFE_WATER, EVAP_RATE_PER_SEC,
+    PUMP_FLOW_PER_SEC, DEFAULT_REFILL_TARGET,
+    HEATER_POWER_PER_SEC, COOLER_POWER_PER_SEC,
+    AMBIENT_TEMP, AMBIENT_SWING, AMBIENT_DRIFT_PER_SEC,
+    AMBIENT_COUPLING_PER_SEC, WATER_NOISE_PER_SEC, LEVEL_NOISE_PER_SEC,
+    PHYSICS_STEP_SEC, PUBLISH_INTERVAL_SEC,
 )
 
-# Current state of the aquarium
-water_temp = 26.0
-water_level = 100.0  # start with full tank
-heater_on = cooler_on = feeder_on = False
-pump_on = False
-pump_target = DEFAULT_REFILL_TARGET
 auth = MqttAuth()
 
-# used to add random temperature changes
-temp_step_counter = 0  
+# number of sensor messages sent (read by fleet.py for throughput)
+published = 0
 
 def log(msg): print(f"[EMULATOR] {msg}")
 
-# MQTT connection functions
+# Random changes grow with the square root of time
+def random_walk(sigma_per_sec, dt):
+    return random.gauss(0.0, sigma_per_sec * math.sqrt(dt))
+
+class TankEmulator:
+    """Sensors, equipment and physics of one simulated tank"""
+    def __init__(self, tank_id=None):
+        self.tank_id = tank_id
+
+        # Current state of the aquarium
+        self.water_temp = 26.0
+        self.water_level = 100.0  # start with full tank
+        self.room_temp = AMBIENT_TEMP
+        self.heater_on = self.cooler_on = self.feeder_on = False
+        self.pump_on = False
+        self.pump_target = DEFAULT_REFILL_TARGET
+
+        # this tank's topics (the plain ones for a single aquarium)
+        self.topic_temp = tank_topic(TOPIC_TEMP, tank_id)
+        self.topic_water = tank_topic(TOPIC_WATER, tank_id)
+        self.topic_feeder = tank_topic(TOPIC_FEEDER, tank_id)
+        self.topic_heater = tank_topic(TOPIC_HEATER, tank_id)
+        self.topic_cooler = tank_topic(TOPIC_COOLER, tank_id)
+        self.topic_pump = tank_topic(TOPIC_PUMP, tank_id)
+
+    def log(self, msg):
+        log(msg if self.tank_id is None else f"Tank {self.tank_id}: {msg}")
+
+    def equipment_topics(self):
+        return [self.topic_feeder, self.topic_heater, self.topic_cooler, self.topic_pump]
+
+    def on_message(self, topic, data):
+        if topic == self.topic_feeder:
+            if data.get("status") == "on":
+                sec = int(data.get("seconds", MAX_FEED_SECONDS))
+                self.feeder_on = True; self.log(f"Fish feeder ON for {sec} seconds")
+                # timer instead of sleeping so other tanks on this connection keep going
+                threading.Timer(sec, self.feeder_off).start()
+
+        elif topic == self.topic_heater:
+            s = data.get("status"); self.heater_on = (s == "on"); self.log(f"Water heater -> {s}")
+
+        elif topic == self.topic_cooler:
+            s = data.get("status"); self.cooler_on = (s == "on"); self.log(f"Water cooler -> {s}")
+
+        elif topic == self.topic_pump:
+            s = data.get("status")
+            self.pump_on = (s == "on")
+            self.pump_target = float(data.get("target", DEFAULT_REFILL_TARGET))
+            self.log(f"Water pump -> {s} (target {self.pump_target}%)")
+
+    def feeder_off(self):
+        self.feeder_on = False; self.log("Fish feeder OFF")
+
+    # Functions to simulate the aquarium behavior
+    # Every step takes dt (seconds of simulated time) and uses per-second rates,
+    # so the result doesn't depend on how often the steps are called.
+    def step_temperature(self, dt=PHYSICS_STEP_SEC):
+        # Room temperature wanders slowly around its average
+        self.room_temp += random_walk(AMBIENT_DRIFT_PER_SEC, dt)
+        self.room_temp = max(AMBIENT_TEMP - AMBIENT_SWING, min(AMBIENT_TEMP + AMBIENT_SWING, self.room_temp))
+
+        # Water slowly moves towards room temperature (exact for any dt)
+        self.water_temp += (self.room_temp - self.water_temp) * (1 - math.exp(-AMBIENT_COUPLING_PER_SEC * dt))
+
+        # Equipment effects on temperature
+        if self.heater_on:
+            self.water_temp += HEATER_POWER_PER_SEC * dt  # heater warms water slowly
+        if self.cooler_on:
+            self.water_temp -= COOLER_POWER_PER_SEC * dt  # cooler cools water slowly
+
+        # Small random changes
+        self.water_temp += random_walk(WATER_NOISE_PER_SEC, dt)
+        self.water_temp = max(15.0, min(35.0, self.water_temp))  # keep within realistic range
+        return round(self.water_temp, 2)
+
+    def step_water_level(self, dt=PHYSICS_STEP_SEC):
+        # Water evaporates slowly over time
+        self.water_level -= EVAP_RATE_PER_SEC * dt
+
+        # Add tiny random variation
+        self.water_level += random_walk(LEVEL_NOISE_PER_SEC, dt)
+
+        # Pump refill (gradual when active)
+        if self.pump_on:
+            self.water_level += PUMP_FLOW_PER_SEC * dt
+            if self.water_level >= self.pump_target:
+                self.pump_on = False
+                self.log(f"Pump OFF - Target {self.pump_target:.1f}% reached")
+
+        # Safety limits
+        self.water_level = max(MIN_SAFE_WATER, min(100.0, self.water_level))
+        return round(self.water_level, 2)
+
+    def step_physics(self, seconds, dt=PHYSICS_STEP_SEC):
+        """Advances the simulation by `seconds` using steps of at most dt"""
+        steps = max(1, math.ceil(seconds / dt))
+        for _ in range(steps):
+            t = self.step_temperature(seconds / steps)
+            l = self.step_water_level(seconds / steps)
+        return t, l
+
+    def publish(self, client, t, l):
+        client.publish(self.topic_temp,  json.dumps({"temp": t, "unit": "C"}))
+        client.publish(self.topic_water, json.dumps({"level": l}))
+
+# MQTT connection functions - userdata maps each equipment topic to its tank
 def on_connect(client, userdata, flags, rc):
     log(f"Connected to MQTT broker, result code={rc}")
     # subscribe to equipment control topics
-    client.subscribe([
-        (TOPIC_FEEDER,0), (TOPIC_HEATER,0),
-        (TOPIC_COOLER,0), (TOPIC_PUMP,0)
-    ])
+    client.subscribe([(topic, 0) for topic in userdata])
 
 def on_message(client, userdata, msg):
-    global feeder_on, heater_on, cooler_on, pump_on, pump_target
     try:
         data = json.loads(msg.payload.decode())
     except Exception:
         data = {}
-
-    if msg.topic == TOPIC_FEEDER:
-        if data.get("status") == "on":
-            sec = int(data.get("seconds", MAX_FEED_SECONDS))
-            feeder_on = True; log(f"Fish feeder ON for {sec} seconds"); time.sleep(sec)
-            feeder_on = False; log("Fish feeder OFF")
-
-    elif msg.topic == TOPIC_HEATER:
-        s = data.get("status"); heater_on = (s == "on"); log(f"Water heater -> {s}")
-
-    elif msg.topic == TOPIC_COOLER:
-        s = data.get("status"); cooler_on = (s == "on"); log(f"Water cooler -> {s}")
-
-    elif msg.topic == TOPIC_PUMP:
-        s = data.get("status")
-        pump_on = (s == "on")
-        pump_target = float(data.get("target", DEFAULT_REFILL_TARGET))
-        log(f"Water pump -> {s} (target {pump_target}%)")
-
-# Functions to simulate the aquarium behavior
-def step_temperature():
-    global water_temp, temp_step_counter
-    
-    # Add some random temperature change every 2 seconds to make it realistic
-    temp_step_counter += 1
-    environmental_change = 0.0
-    if temp_step_counter >= 2:
-        temp_step_counter = 0
-        # Random temperature drift (like room temp changing)
-        environmental_change = random.choice([-0.05, 0.05])
-        print(f"[EMULATOR] Room temperature changed by: {environmental_change:+.2f}°C")
-    
-    # Small random changes each second
-    drift = random.uniform(-0.01, 0.01)
-    
-    # Equipment effects on temperature
-    actuator_change = 0.0
-    if heater_on: 
-        actuator_change += 0.1  # heater warms water slowly
-    if cooler_on: 
-        actuator_change -= 0.1  # cooler cools water slowly
-        
-    # Update temperature
-    water_temp += environmental_change + actuator_change + drift
-    water_temp = max(15.0, min(35.0, water_temp))  # keep within realistic range
-    return round(water_temp, 2)
-
-def step_water_level():
-    global water_level, pump_on, pump_target
-
-    # Water evaporates slowly over time
-    evaporation = EVAP_RATE_PER_STEP
-    water_level -= evaporation
-    
-    # Add tiny random variation
-    variation = random.uniform(-0.001, 0.001)
-    water_level += variation
-
-    # 2. PUMP REFILL (gradual when active)
-    if pump_on:
-        refill_amount = REFILL_RATE_PER_STEP
-        water_level += refill_amount
-        if water_level >= pump_target:
-            pump_on = False
-            log(f"Pump OFF - Target {pump_target:.1f}% reached")
-
-    # 3. SAFETY LIMITS
-    water_level = max(MIN_SAFE_WATER, min(100.0, water_level))
-    
-    return round(water_level, 2)
+    tank = userdata.get(msg.topic)
+    if tank is not None:
+        tank.on_message(msg.topic, data)
 
 # -------- main loop --------
-def make_client():
+def make_client(tanks, client_id="emulator.smart_aquarium"):
     cl = mqtt.Client(
-        client_id="emulator.smart_aquarium",
+        client_id=client_id,
         clean_session=True,
+        userdata={topic: tank for tank in tanks for topic in tank.equipment_topics()},
         transport=auth.transport,
         callback_api_version=mqtt.CallbackAPIVersion.VERSION1  # תואם לקוד שלך
     )
@@ -125,22 +159,32 @@ def make_client():
     cl.on_message = on_message
     return cl
 
-def main():
-    client = make_client()
+def main(tank_ids=None, stop=None):
+    """Runs a single aquarium, or every tank in tank_ids over one connection
+    (fleet.py), until Ctrl+C or until the stop event is set"""
+    global published
+    tanks = [TankEmulator(t) for t in tank_ids] if tank_ids else [TankEmulator()]
+    stop = stop or threading.Event()
+    client = make_client(tanks, "emulator.smart_aquarium" + client_suffix(tank_ids))
     log(f"CONNECTING TO {auth.host}:{auth.port}")
     client.connect(auth.host, auth.port, 60)
     client.loop_start()
+    log(f"{len(tanks)} tank(s), physics step {PHYSICS_STEP_SEC}s, publishing every {PUBLISH_INTERVAL_SEC}s")
+    last_step = next_publish = time.monotonic()
     try:
-        while True:
-            # Sensor readings - just temperature and water level
-            t = step_temperature()
-            l = step_water_level()
-            
-            # Publish sensor data
-            client.publish(TOPIC_TEMP,  json.dumps({"temp": t, "unit": "C"}))
-            client.publish(TOPIC_WATER, json.dumps({"level": l}))
+        while not stop.is_set():
+            # Catch the simulation up with real time, then read the sensors
+            now = time.monotonic()
+            for tank in tanks:
+                t, l = tank.step_physics(now - last_step)
+                
+                # Publish sensor data
+                tank.publish(client, t, l)
+                published += 2
+            last_step = now
             
-            time.sleep(1.0)  # Faster updates for responsive demo (1 second per reading)
+            next_publish += PUBLISH_INTERVAL_SEC
+            stop.wait(max(0.0, next_publish - time.monotonic()))
     except KeyboardInterrupt:
         log("Shutting down emulator...")
     finally:
@@ -0,0 +1,330 @@
+# Fleet launcher for load tests - runs many emulators, managers and loggers at once
+#
+# Example: 10 tanks, emulators split over 2 shards, managers over 2, one logger shard
+#   python fleet.py --tanks 10 --emulators 2 --managers 2 --loggers 1
+#
+# Every shard is one process in a process pool and serves a contiguous range
+# of tanks over a single MQTT connection. Each tank has its own topics
+# (aquarium/<tank>/...) and logger database (aquarium_data_tank<N>.db).
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import multiprocessing as mp
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from init import (
+    FLEET_RESTART_DELAY, FLEET_MAX_RESTART_DELAY, FLEET_MAX_RESTARTS,
+    FLEET_STATUS_INTERVAL, FLEET_STOP_TIMEOUT,
+)
+
+ROLES = ("emulator", "manager", "logger")
+
+def log(msg): print(f"[FLEET] {msg}", flush=True)
+
+def split_tanks(tanks, shards):
+    """Splits tank ids 1..tanks into `shards` contiguous ranges"""
+    size, extra = divmod(tanks, shards)
+    ranges, start = [], 1
+    for shard in range(shards):
+        end = start + size + (1 if shard < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+def read_rss_mb(pid):
+    """Resident memory of a process in MB (Linux only, None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+# -------- pool process side --------
+class StopFlag:
+    """Event-like stop signal over a shared flag. multiprocessing.Event can't be
+    used: setting it waits on every waiter, and a killed process never answers."""
+    def __init__(self, flag):
+        self.flag = flag
+
+    def is_set(self):
+        return bool(self.flag.value)
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.is_set():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            time.sleep(min(left, 0.1))
+        return True
+
+# shared with the supervisor, handed over by init_worker()
+stop_event = counts = pids = None
+
+def stop_worker(signum, frame):
+    # the shards already clean up on Ctrl+C, so reuse that path
+    raise KeyboardInterrupt
+
+def init_worker(stop_flag, shard_counts, shard_pids):
+    global stop_event, counts, pids
+    stop_event, counts, pids = StopFlag(stop_flag), shard_counts, shard_pids
+    signal.signal(signal.SIGTERM, stop_worker)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when we stop
+
+def report_count(index, get_count, done):
+    while not done.wait(1.0):
+        counts[index] = get_count()
+
+def run_shard(role, index, tank_ids):
+    """Serves every tank in tank_ids until the supervisor sets stop_event"""
+    pids[index] = os.getpid()
+    counts[index] = 0
+
+    if role == "emulator":
+        import emulator
+        get_count = lambda: emulator.published
+        run = lambda: emulator.main(tank_ids, stop_event)
+    elif role == "manager":
+        import manager
+        get_count = lambda: manager.handled
+        run = lambda: manager.make_client(tank_ids, stop_event)
+    else:
+        import data_manager
+        loggers = [data_manager.AquariumDataManager(f"aquarium_data_tank{t}.db", t) for t in tank_ids]
+        get_count = lambda: sum(dm.stored for dm in loggers)
+        run = lambda: data_manager.collect(loggers, stop_event)
+
+    # counters keep growing across restarts in the same process, report the difference
+    first_count = get_count()
+    done = threading.Event()
+    threading.Thread(target=report_count, args=(index, lambda: get_count() - first_count, done),
+                     daemon=True).start()
+    try:
+        run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        done.set()
+        counts[index] = get_count() - first_count
+        pids[index] = 0
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+# -------- supervisor side --------
+class Shard:
+    """One pool task: a role serving a contiguous range of tanks"""
+    def __init__(self, role, index, number, tank_ids):
+        self.role = role
+        self.index = index      # slot in the shared counts/pids arrays
+        self.number = number    # shard number within its role
+        self.tank_ids = tank_ids
+        self.future = None
+        self.started_at = None
+        self.restarts = 0       # total, for the status table
+        self.crashes = 0        # in a row, drives the backoff
+        self.retry_at = None
+        self.failed = False
+        self.last_count = 0
+        self.last_time = time.monotonic()
+        self.rate = 0.0
+
+    @property
+    def name(self):
+        return f"{self.role}[{self.number}] tanks {self.tank_ids[0]}-{self.tank_ids[-1]}"
+
+    @property
+    def state(self):
+        if self.failed:
+            return "FAILED"
+        if self.future is not None and not self.future.done():
+            return "running"
+        return "waiting" if self.retry_at is not None else "stopped"
+
+class FleetSupervisor:
+    def __init__(self, tanks, emulators=1, managers=1, loggers=1):
+        self.ctx = mp.get_context("spawn")
+        self.shards = []
+        for role, count in zip(ROLES, (emulators, managers, loggers)):
+            for number, tank_ids in enumerate(split_tanks(tanks, count)):
+                self.shards.append(Shard(role, len(self.shards), number, tank_ids))
+        self.stop_flag = self.ctx.Value("b", 0, lock=False)
+        self.counts = self.ctx.Array("q", len(self.shards), lock=False)
+        self.pids = self.ctx.Array("q", len(self.shards), lock=False)
+        self.pool = None
+        self.stopping = False
+
+    def make_pool(self):
+        self.pool = ProcessPoolExecutor(
+            max_workers=len(self.shards),
+            mp_context=self.ctx,
+            initializer=init_worker,
+            initargs=(self.stop_flag, self.counts, self.pids),
+        )
+
+    def submit(self, shard):
+        shard.future = self.pool.submit(run_shard, shard.role, shard.index, shard.tank_ids)
+        shard.started_at = time.monotonic()
+        shard.retry_at = None
+        self.counts[shard.index] = 0  # don't let the last run's count show up as a burst
+        shard.last_count = 0
+        shard.last_time = shard.started_at
+
+    def shard_stopped(self, shard, now):
+        """Schedules a restart with exponential backoff, or gives up"""
+        error = shard.future.exception()
+        shard.future = None
+        log(f"{shard.name} stopped: {error!r}" if error else f"{shard.name} returned")
+        if self.stopping:
+            return  # shutting down (e.g. SIGTERM to the whole group), not a crash
+
+        # a shard that ran for a good while before dying starts its backoff over
+        if now - shard.started_at >= FLEET_MAX_RESTART_DELAY:
+            shard.crashes = 0
+        shard.crashes += 1
+        if shard.crashes > FLEET_MAX_RESTARTS:
+            shard.failed = True
+            log(f"{shard.name} FAILED - crashed {FLEET_MAX_RESTARTS + 1} times in a row, not restarting")
+            return
+        delay = min(FLEET_RESTART_DELAY * 2 ** (shard.crashes - 1), FLEET_MAX_RESTART_DELAY)
+        shard.retry_at = now + delay
+        log(f"Restarting {shard.name} in {delay:.1f}s")
+
+    def rebuild_pool(self, now):
+        """A pool process died outright, which takes the whole pool down with it.
+        Only the shard that died counts a crash, the others come back at once."""
+        log("Process pool broke - starting a new one")
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for shard in self.shards:
+            if shard.future is None:
+                continue
+            # shards stopped by the pool clear their pid on the way out,
+            # the one that was killed never got the chance
+            if self.pids[shard.index]:
+                self.pids[shard.index] = 0
+                self.shard_stopped(shard, now)
+            else:
+                log(f"{shard.name} was stopped with the pool - restarting it now")
+                shard.future = None
+                shard.retry_at = now
+        self.make_pool()
+
+    def check_shards(self):
+        now = time.monotonic()
+        broken = False
+        for shard in self.shards:
+            if shard.future is None or not shard.future.done():
+                continue
+            if isinstance(shard.future.exception(), BrokenProcessPool):
+                broken = True
+            else:
+                self.shard_stopped(shard, now)
+
+        if broken:
+            self.rebuild_pool(now)
+
+        for shard in self.shards:
+            if shard.retry_at is not None and now >= shard.retry_at:
+                shard.restarts += 1
+                log(f"Restarting {shard.name} (restart #{shard.restarts})")
+                self.submit(shard)
+
+    def update_rates(self):
+        now = time.monotonic()
+        for shard in self.shards:
+            count = self.counts[shard.index]
+            elapsed = now - shard.last_time
+            if shard.state != "running":
+                shard.rate = 0.0
+            elif elapsed > 0:
+                shard.rate = max(0, count - shard.last_count) / elapsed
+            shard.last_count, shard.last_time = count, now
+
+    def status(self):
+        """One text table with every shard process plus totals per role"""
+        self.update_rates()
+        lines = [f"{'shard':<28}{'pid':>8}{'state':>9}{'restarts':>10}{'msg/s':>9}{'RSS MB':>9}"]
+        totals = {role: [0, 0, 0.0, 0.0] for role in ROLES}
+        for shard in self.shards:
+            running = shard.state == "running"
+            pid = self.pids[shard.index] if running else 0
+            rss = read_rss_mb(pid) if pid else None
+            lines.append(
+                f"{shard.name:<28}{pid or '-':>8}{shard.state:>9}{shard.restarts:>10}"
+                f"{shard.rate:>9.1f}{f'{rss:.1f}' if rss is not None else '-':>9}"
+            )
+            total = totals[shard.role]
+            total[0] += running
+            total[1] += 1
+            total[2] += shard.rate
+            total[3] += rss or 0.0
+        for role, (running, count, rate, rss) in totals.items():
+            lines.append(f"TOTAL {role:<10} {running}/{count} running, {rate:.1f} msg/s, {rss:.1f} MB")
+        return "\n".join(lines)
+
+    def stop(self):
+        """Ask every shard to stop, give them time to flush, then kill what's left"""
+        self.stopping = True
+        log("Stopping shards...")
+        self.stop_flag.value = 1
+        running = [shard.future for shard in self.shards if shard.future is not None]
+        _, not_done = futures.wait(running, timeout=FLEET_STOP_TIMEOUT)
+        for shard in self.shards:
+            if shard.future in not_done:
+                pid = self.pids[shard.index]
+                log(f"{shard.name} did not stop in time - killing it")
+                if pid:
+                    os.kill(pid, signal.SIGKILL)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for shard in self.shards:
+            shard.retry_at = None
+        log("Final status\n" + self.status())
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        log(f"Starting {len(self.shards)} shards")
+        self.make_pool()
+        for shard in self.shards:
+            self.submit(shard)
+
+        next_status = time.monotonic() + FLEET_STATUS_INTERVAL
+        try:
+            while not self.stopping:
+                time.sleep(0.5)
+                if self.stopping:
+                    break  # don't treat shards that are already stopping as crashed
+                self.check_shards()
+                if time.monotonic() >= next_status:
+                    log("Status\n" + self.status())
+                    next_status += FLEET_STATUS_INTERVAL
+        finally:
+            self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fleet of simulated aquariums")
+    parser.add_argument("--tanks", type=int, default=1, help="number of tanks (ids 1..N)")
+    parser.add_argument("--emulators", type=int, default=1, help="emulator shards")
+    parser.add_argument("--managers", type=int, default=1, help="manager shards")
+    parser.add_argument("--loggers", type=int, default=1, help="data logger shards")
+    args = parser.parse_args()
+
+    for name in ("tanks", "emulators", "managers", "loggers"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name} must be at least 1")
+        if name != "tanks" and getattr(args, name) > args.tanks:
+            parser.error(f"--{name} can't be more than --tanks")
+
+    FleetSupervisor(args.tanks, args.emulators, args.managers, args.loggers).run()
+
+if __name__ == "__main__":
+    main()
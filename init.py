@@ -29,6 +29,19 @@ TOPIC_PUMP        = COMM_TOPIC + "actuators/pump"           # water pump
 # Topic for system alerts
 TOPIC_ALERTS      = COMM_TOPIC + "alerts"                   
 
+# When fleet.py runs many tanks, every tank gets its own copy of the topics
+def tank_topic(topic, tank_id=None):
+    """aquarium/<tank>/... for one tank of a fleet, unchanged for a single aquarium"""
+    if tank_id is None:
+        return topic
+    return f"{COMM_TOPIC}{tank_id}/{topic[len(COMM_TOPIC):]}"
+
+def client_suffix(tank_ids=None):
+    """Added to MQTT client ids so shards don't kick each other off the broker"""
+    if not tank_ids:
+        return ""
+    return f".tanks{tank_ids[0]}-{tank_ids[-1]}"
+
 # Temperature settings
 DEFAULT_TARGET_TEMP = 24.0  # good temperature for tropical fish
 HEATER_HYSTERESIS   = 0.5   # prevents heater from turning on/off too much
@@ -36,10 +49,24 @@ MAX_FEED_SECONDS    = 3     # max feeding time
 
 # Water behavior settings - made these realistic
 MIN_SAFE_WATER       = 10.0      # emergency minimum water level
-EVAP_RATE_PER_STEP   = 0.02      # how fast water evaporates (0.02% per second)
-REFILL_RATE_PER_STEP = 0.05      # how fast pump refills (0.05% per second)
+EVAP_RATE_PER_SEC    = 0.02      # how fast water evaporates (% per second)
+PUMP_FLOW_PER_SEC    = 0.05      # how fast pump refills (% per second)
 DEFAULT_REFILL_TARGET= 85.0      # stop refilling at this level
 
+# Temperature behavior settings (all rates are per second of simulated time)
+HEATER_POWER_PER_SEC     = 0.1    # °C per second the heater adds
+COOLER_POWER_PER_SEC     = 0.1    # °C per second the cooler removes
+AMBIENT_TEMP             = 24.0   # average room temperature
+AMBIENT_SWING            = 5.0    # room temperature wanders at most this far from average
+AMBIENT_DRIFT_PER_SEC    = 0.035  # how fast the room temperature wanders (°C per √second)
+AMBIENT_COUPLING_PER_SEC = 0.002  # share of the water/room difference exchanged per second
+WATER_NOISE_PER_SEC      = 0.006  # small random temperature changes (°C per √second)
+LEVEL_NOISE_PER_SEC      = 0.0006 # tiny random water level changes (% per √second)
+
+# Emulator timing - physics runs in small steps, sensors publish less often
+PHYSICS_STEP_SEC     = 0.1       # integration step (smaller = more accurate, more CPU)
+PUBLISH_INTERVAL_SEC = 1.0       # how often sensor readings are sent
+
 # When to trigger water level alerts
 WATER_CRITICAL       = 20.0      # critical - need water now!
 WATER_LOW            = 70.0      # low - start refilling
@@ -52,3 +79,27 @@ class MqttAuth:
     username: str = USERNAME
     password: str = PASSWORD
     transport: str = TRANSPORT
+
+# Local query service (read-only HTTP/JSON over the database)
+QUERY_HOST        = "127.0.0.1"
+QUERY_PORT        = 8080
+QUERY_POOL_SIZE   = 4        # read-only connections shared by request threads
+QUERY_CACHE_SIZE  = 256      # max cached responses (least recently used dropped)
+QUERY_CACHE_TTL   = 5.0      # seconds a cached response stays valid
+QUERY_PAGE_LIMIT  = 100      # default rows per page
+QUERY_MAX_LIMIT   = 1000     # hard cap on rows per page
+
+# Fleet launcher settings (fleet.py)
+FLEET_RESTART_DELAY     = 2.0    # first wait before restarting a crashed shard (doubles each time)
+FLEET_MAX_RESTART_DELAY = 60.0   # longest wait between restarts
+FLEET_MAX_RESTARTS      = 5      # crashes in a row before a shard is marked failed
+FLEET_STATUS_INTERVAL   = 10.0   # seconds between status reports
+FLEET_STOP_TIMEOUT      = 5.0    # seconds a shard gets to shut down before it is killed
+
+# Database maintenance (runs inside the data logger between inserts)
+MAINT_INTERVAL_SEC      = 60.0    # how often maintenance runs
+MAINT_QUIET_SEC         = 0.2     # only start a step when nothing was saved for this long
+MAINT_STEP_BUDGET_SEC   = 0.05    # a single step is cut off after this long
+MAINT_VACUUM_PAGES      = 64      # pages given back per incremental_vacuum batch
+MAINT_ANALYZE_EVERY_SEC = 3600.0  # how often to refresh query planner statistics
+MAINT_ANALYZE_LIMIT     = 400     # rows ANALYZE samples per index (keeps it fast)
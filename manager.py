@@ -1,8 +1,9 @@
 # Smart manager for my aquarium - the "brain" that controls everything automatically
 import json
+import threading
 import paho.mqtt.client as mqtt
 from init import (
-    MqttAuth,
+    MqttAuth, tank_topic, client_suffix,
     # sensors
     TOPIC_TEMP, TOPIC_WATER,
     # controls (GUI->manager)
@@ -18,127 +19,163 @@ from init import (
 )
 
 auth = MqttAuth()
-target_temp = DEFAULT_TARGET_TEMP  # temperature we want to maintain
-last_water_level = None
-pump_on = False  # keep track of whether pump is running
 
-# for manual refill mode (None = automatic, number = manual target)
-manual_refill_target = None
-
-def make_client():
+# number of messages handled (read by fleet.py for throughput)
+handled = 0
+
+class TankManager:
+    """Decisions and control state for one tank"""
+    def __init__(self, tank_id=None):
+        self.tank_id = tank_id
+        self.tag = "[MANAGER]" if tank_id is None else f"[MANAGER tank {tank_id}]"
+        self.target_temp = DEFAULT_TARGET_TEMP  # temperature we want to maintain
+        self.last_water_level = None
+        self.pump_on = False  # keep track of whether pump is running
+
+        # for manual refill mode (None = automatic, number = manual target)
+        self.manual_refill_target = None
+
+        # this tank's topics (the plain ones for a single aquarium)
+        self.topic_temp = tank_topic(TOPIC_TEMP, tank_id)
+        self.topic_water = tank_topic(TOPIC_WATER, tank_id)
+        self.topic_feed_cmd = tank_topic(TOPIC_FEED_CMD, tank_id)
+        self.topic_heater_cmd = tank_topic(TOPIC_HEATER_CMD, tank_id)
+        self.topic_pump_cmd = tank_topic(TOPIC_PUMP_CMD, tank_id)
+        self.topic_feeder = tank_topic(TOPIC_FEEDER, tank_id)
+        self.topic_heater = tank_topic(TOPIC_HEATER, tank_id)
+        self.topic_cooler = tank_topic(TOPIC_COOLER, tank_id)
+        self.topic_pump = tank_topic(TOPIC_PUMP, tank_id)
+        self.topic_alerts = tank_topic(TOPIC_ALERTS, tank_id)
+
+    def input_topics(self):
+        # all the topics we need to monitor
+        return [
+            self.topic_temp, self.topic_water,
+            self.topic_feed_cmd, self.topic_heater_cmd, self.topic_pump_cmd,
+        ]
+
+    def send_alert(self, client, level, msg):
+        client.publish(self.topic_alerts, json.dumps({"level": level, "msg": msg}))
+
+    def heater_cooler_control(self, client, temp):
+        target_temp = self.target_temp
+        print(f"{self.tag} Temp control: current={temp}°C, target={target_temp}°C, hysteresis={HEATER_HYSTERESIS}")
+        if temp < target_temp - HEATER_HYSTERESIS:
+            print(f"{self.tag} Activating HEATER (temp {temp} < {target_temp - HEATER_HYSTERESIS})")
+            client.publish(self.topic_heater, json.dumps({"status": "on"}))
+            client.publish(self.topic_cooler, json.dumps({"status": "off"}))
+        elif temp > target_temp + HEATER_HYSTERESIS:
+            print(f"{self.tag} Activating COOLER (temp {temp} > {target_temp + HEATER_HYSTERESIS})")
+            client.publish(self.topic_cooler, json.dumps({"status": "on"}))
+            client.publish(self.topic_heater, json.dumps({"status": "off"}))
+        else:
+            print(f"{self.tag} Temperature OK - turning off both heater and cooler")
+            client.publish(self.topic_heater, json.dumps({"status": "off"}))
+            client.publish(self.topic_cooler, json.dumps({"status": "off"}))
+
+    def set_pump(self, client, on: bool, target: float = None):
+        self.pump_on = on
+        payload = {"status": "on" if on else "off"}
+        if on and target is not None:
+            payload["target"] = float(target)
+        print(f"{self.tag} Pump command: {payload}")
+        client.publish(self.topic_pump, json.dumps(payload))
+
+    def on_message(self, client, topic, data):
+        if topic == self.topic_temp:
+            temp = float(data.get("temp", 0))
+            self.heater_cooler_control(client, temp)
+            if temp < 18:
+                self.send_alert(client, "WARNING", f"Water too cold: {temp}C")
+            elif temp > 30:
+                self.send_alert(client, "WARNING", f"Water too hot: {temp}C")
+
+        elif topic == self.topic_water:
+            level = float(data.get("level", 0))
+            print(f"{self.tag} Water level: {level:.1f}%, pump_on: {self.pump_on}")
+
+            # ----- WATER LEVEL ALERTS -----
+            if level <= WATER_CRITICAL:
+                self.send_alert(client, "CRITICAL", f"CRITICAL: Water level at {level:.1f}%!")
+            elif level <= WATER_LOW:
+                self.send_alert(client, "WARNING", f"Low water level: {level:.1f}%")
+
+            # ----- SIMPLE AUTO-REFILL LOGIC -----
+            if self.manual_refill_target is not None:
+                # Manual refill mode (from GUI button)
+                if level >= self.manual_refill_target - 0.5:
+                    self.set_pump(client, False)
+                    self.send_alert(client, "INFO", f"Manual refill complete: {level:.1f}%")
+                    self.manual_refill_target = None
+                else:
+                    self.set_pump(client, True, target=self.manual_refill_target)
+            else:
+                # Automatic refill logic
+                if level <= WATER_LOW and not self.pump_on:  # Start refill
+                    self.set_pump(client, True, target=WATER_TARGET)
+                    self.send_alert(client, "INFO", f"Auto-refill started (level: {level:.1f}%)")
+                elif level >= WATER_TARGET and self.pump_on:  # Stop refill
+                    self.set_pump(client, False)
+                    self.send_alert(client, "INFO", f"Auto-refill complete (level: {level:.1f}%)")
+
+            self.last_water_level = level
+
+        elif topic == self.topic_heater_cmd:
+            t = data.get("target")
+            if t is not None:
+                self.target_temp = float(t)
+                self.send_alert(client, "INFO", f"Target temp set to {self.target_temp}C")
+
+        elif topic == self.topic_feed_cmd:
+            if data.get("feed"):
+                sec = int(data.get("seconds", MAX_FEED_SECONDS))
+                client.publish(self.topic_feeder, json.dumps({"status": "on", "seconds": sec}))
+                self.send_alert(client, "INFO", f"Feeder ON for {sec}s")
+
+        elif topic == self.topic_pump_cmd:
+            # Manual refill button
+            if data.get("refill"):
+                self.manual_refill_target = float(data.get("target", WATER_TARGET))
+                self.set_pump(client, True, target=self.manual_refill_target)
+                self.send_alert(client, "INFO", f"Manual refill started → {self.manual_refill_target:.1f}%")
+
+def make_client(tank_ids=None, stop=None):
+    """Manages a single aquarium, or every tank in tank_ids over one connection
+    (fleet.py), until Ctrl+C or until the stop event is set"""
+    tanks = [TankManager(t) for t in tank_ids] if tank_ids else [TankManager()]
+    stop = stop or threading.Event()
     cl = mqtt.Client(
-        client_id="manager.smart_aquarium",
+        client_id="manager.smart_aquarium" + client_suffix(tank_ids),
         clean_session=True,
+        userdata={topic: tank for tank in tanks for topic in tank.input_topics()},
         transport=auth.transport,
         callback_api_version=mqtt.CallbackAPIVersion.VERSION1
     )
     if auth.username: cl.username_pw_set(auth.username, auth.password)
     cl.on_connect, cl.on_message = on_connect, on_message
     cl.connect(auth.host, auth.port, 60)
-    cl.loop_forever()
+    cl.loop_start()
+    try:
+        while not stop.wait(0.5):
+            pass
+    finally:
+        cl.loop_stop(); cl.disconnect()
 
+# userdata maps every topic we listen to onto the tank it belongs to
 def on_connect(client, userdata, flags, rc):
     print("Smart manager connected to MQTT:", rc)
-    # subscribe to all the topics we need to monitor
-    client.subscribe([
-        (TOPIC_TEMP, 0),
-        (TOPIC_WATER, 0),
-        (TOPIC_FEED_CMD, 0),
-        (TOPIC_HEATER_CMD, 0),
-        (TOPIC_PUMP_CMD, 0),
-    ])
-
-def send_alert(client, level, msg):
-    client.publish(TOPIC_ALERTS, json.dumps({"level": level, "msg": msg}))
-
-def heater_cooler_control(client, temp):
-    global target_temp
-    print(f"[MANAGER] Temp control: current={temp}°C, target={target_temp}°C, hysteresis={HEATER_HYSTERESIS}")
-    if temp < target_temp - HEATER_HYSTERESIS:
-        print(f"[MANAGER] Activating HEATER (temp {temp} < {target_temp - HEATER_HYSTERESIS})")
-        client.publish(TOPIC_HEATER, json.dumps({"status": "on"}))
-        client.publish(TOPIC_COOLER, json.dumps({"status": "off"}))
-    elif temp > target_temp + HEATER_HYSTERESIS:
-        print(f"[MANAGER] Activating COOLER (temp {temp} > {target_temp + HEATER_HYSTERESIS})")
-        client.publish(TOPIC_COOLER, json.dumps({"status": "on"}))
-        client.publish(TOPIC_HEATER, json.dumps({"status": "off"}))
-    else:
-        print(f"[MANAGER] Temperature OK - turning off both heater and cooler")
-        client.publish(TOPIC_HEATER, json.dumps({"status": "off"}))
-        client.publish(TOPIC_COOLER, json.dumps({"status": "off"}))
-
-def set_pump(client, on: bool, target: float = None):
-    global pump_on
-    pump_on = on
-    payload = {"status": "on" if on else "off"}
-    if on and target is not None:
-        payload["target"] = float(target)
-    print(f"[MANAGER] Pump command: {payload}")
-    client.publish(TOPIC_PUMP, json.dumps(payload))
+    client.subscribe([(topic, 0) for topic in userdata])
 
 def on_message(client, userdata, msg):
-    global target_temp, last_water_level, manual_refill_target
+    global handled
+    handled += 1
     try:
         data = json.loads(msg.payload.decode())
     except Exception:
         data = {}
-
-    if msg.topic == TOPIC_TEMP:
-        temp = float(data.get("temp", 0))
-        heater_cooler_control(client, temp)
-        if temp < 18:
-            send_alert(client, "WARNING", f"Water too cold: {temp}C")
-        elif temp > 30:
-            send_alert(client, "WARNING", f"Water too hot: {temp}C")
-
-    elif msg.topic == TOPIC_WATER:
-        level = float(data.get("level", 0))
-        print(f"[MANAGER] Water level: {level:.1f}%, pump_on: {pump_on}")
-
-        # ----- WATER LEVEL ALERTS -----
-        if level <= WATER_CRITICAL:
-            send_alert(client, "CRITICAL", f"CRITICAL: Water level at {level:.1f}%!")
-        elif level <= WATER_LOW:
-            send_alert(client, "WARNING", f"Low water level: {level:.1f}%")
-
-        # ----- SIMPLE AUTO-REFILL LOGIC -----
-        if manual_refill_target is not None:
-            # Manual refill mode (from GUI button)
-            if level >= manual_refill_target - 0.5:
-                set_pump(client, False)
-                send_alert(client, "INFO", f"Manual refill complete: {level:.1f}%")
-                manual_refill_target = None
-            else:
-                set_pump(client, True, target=manual_refill_target)
-        else:
-            # Automatic refill logic
-            if level <= WATER_LOW and not pump_on:  # Start refill
-                set_pump(client, True, target=WATER_TARGET)
-                send_alert(client, "INFO", f"Auto-refill started (level: {level:.1f}%)")
-            elif level >= WATER_TARGET and pump_on:  # Stop refill
-                set_pump(client, False)
-                send_alert(client, "INFO", f"Auto-refill complete (level: {level:.1f}%)")
-
-        last_water_level = level
-
-    elif msg.topic == TOPIC_HEATER_CMD:
-        t = data.get("target")
-        if t is not None:
-            target_temp = float(t)
-            send_alert(client, "INFO", f"Target temp set to {target_temp}C")
-
-    elif msg.topic == TOPIC_FEED_CMD:
-        if data.get("feed"):
-            sec = int(data.get("seconds", MAX_FEED_SECONDS))
-            client.publish(TOPIC_FEEDER, json.dumps({"status": "on", "seconds": sec}))
-            send_alert(client, "INFO", f"Feeder ON for {sec}s")
-
-    elif msg.topic == TOPIC_PUMP_CMD:
-        # Manual refill button
-        if data.get("refill"):
-            manual_refill_target = float(data.get("target", WATER_TARGET))
-            set_pump(client, True, target=manual_refill_target)
-            send_alert(client, "INFO", f"Manual refill started → {manual_refill_target:.1f}%")
+    tank = userdata.get(msg.topic)
+    if tank is not None:
+        tank.on_message(client, msg.topic, data)
 
 if __name__ == "__main__":
-    make_client()
\ No newline at end of file
+    make_client()
@@ -0,0 +1,299 @@
+# Read-only query service for my aquarium - serves database history as HTTP/JSON
+import os
+import json
+import argparse
+import queue
+import sqlite3
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from init import (
+    QUERY_HOST, QUERY_PORT, QUERY_POOL_SIZE,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL,
+    QUERY_PAGE_LIMIT, QUERY_MAX_LIMIT,
+)
+
+# strftime patterns used to group readings for aggregates
+BUCKETS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour":   "%Y-%m-%d %H:00:00",
+    "day":    "%Y-%m-%d",
+}
+
+class ConnectionPool:
+    """Fixed set of read-only connections shared by the request threads"""
+    def __init__(self, db_path, size=QUERY_POOL_SIZE):
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        self._pool = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._pool.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, waiting if all of them are busy"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self._pool.get().close()
+
+class ResponseCache:
+    """LRU cache of responses - entries expire after ttl seconds,
+    and everything is dropped as soon as new rows are inserted"""
+    def __init__(self, max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key, generation):
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, body = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, generation, body):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (time.monotonic(), body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+def parse_limit(params):
+    limit = int(params.get("limit", QUERY_PAGE_LIMIT))
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, QUERY_MAX_LIMIT)
+
+def parse_cursor(params):
+    cursor = params.get("cursor")
+    if not cursor:
+        return None
+    # must fit SQLite's 64-bit integers or execute() raises OverflowError
+    try:
+        cursor = int(cursor)
+    except ValueError:
+        raise ValueError("cursor must be a row id")
+    if not -2**63 <= cursor < 2**63:
+        raise ValueError("cursor out of range")
+    return cursor
+
+def parse_time(value, name):
+    """Accepts ISO times and returns them in SQLite's CURRENT_TIMESTAMP format
+    (UTC) - times without an offset are taken to be UTC already"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date/time")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+def page(rows, limit):
+    """Turns limit+1 rows into one page plus the cursor for the next one"""
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+class AquariumQueryService:
+    def __init__(self, db_path="aquarium_data.db"):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path)
+        self.cache = ResponseCache()
+        self.routes = {
+            "/readings/recent": self.recent_readings,
+            "/readings/range": self.range_readings,
+            "/readings/aggregate": self.aggregate_readings,
+            "/alerts": self.recent_alerts,
+        }
+
+    def generation(self, conn):
+        """Last used row ids - changes whenever the logger inserts something"""
+        return tuple(conn.execute("SELECT name, seq FROM sqlite_sequence ORDER BY name"))
+
+    def query(self, path, params):
+        """Runs one request, answering from the cache when possible"""
+        handler = self.routes.get(path)
+        if handler is None:
+            raise LookupError(f"Unknown path: {path}")
+
+        key = (path, tuple(sorted(params.items())))
+        with self.pool.connection() as conn:
+            generation = self.generation(conn)
+            body = self.cache.get(key, generation)
+            if body is None:
+                body = json.dumps(handler(conn, params)).encode()
+                self.cache.put(key, generation, body)
+        return body
+
+    # Endpoints
+    def recent_readings(self, conn, params):
+        """Newest readings first, paging backwards with ?cursor="""
+        limit = parse_limit(params)
+        cursor = parse_cursor(params)
+        sql = "SELECT * FROM sensor_readings WHERE 1=1"
+        args = []
+        if params.get("sensor_type"):
+            sql += " AND sensor_type = ?"
+            args.append(params["sensor_type"])
+        if cursor is not None:
+            sql += " AND id < ?"
+            args.append(cursor)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit + 1)
+        return page(conn.execute(sql, args).fetchall(), limit)
+
+    def range_readings(self, conn, params):
+        """Readings between ?start= and ?end= in time order"""
+        limit = parse_limit(params)
+        cursor = parse_cursor(params)
+        start = parse_time(params.get("start"), "start")
+        end = parse_time(params.get("end"), "end")
+        if start is None:
+            raise ValueError("start is required")
+        sql = "SELECT * FROM sensor_readings WHERE timestamp >= ?"
+        args = [start]
+        if end is not None:
+            sql += " AND timestamp < ?"
+            args.append(end)
+        if params.get("sensor_type"):
+            sql += " AND sensor_type = ?"
+            args.append(params["sensor_type"])
+        if cursor is not None:
+            sql += " AND id > ?"
+            args.append(cursor)
+        sql += " ORDER BY id LIMIT ?"
+        args.append(limit + 1)
+        return page(conn.execute(sql, args).fetchall(), limit)
+
+    def aggregate_readings(self, conn, params):
+        """Count, average, min and max per time bucket and sensor type"""
+        bucket = params.get("bucket", "hour")
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        start = parse_time(params.get("start"), "start")
+        end = parse_time(params.get("end"), "end")
+        sql = '''
+            SELECT strftime(?, timestamp) AS bucket, sensor_type,
+                   COUNT(*) AS count,
+                   AVG(temperature) AS avg_temperature,
+                   MIN(temperature) AS min_temperature,
+                   MAX(temperature) AS max_temperature,
+                   AVG(water_level) AS avg_water_level,
+                   MIN(water_level) AS min_water_level,
+                   MAX(water_level) AS max_water_level
+            FROM sensor_readings WHERE 1=1
+        '''
+        args = [BUCKETS[bucket]]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            args.append(start)
+        if end is not None:
+            sql += " AND timestamp < ?"
+            args.append(end)
+        if params.get("sensor_type"):
+            sql += " AND sensor_type = ?"
+            args.append(params["sensor_type"])
+        sql += " GROUP BY bucket, sensor_type ORDER BY bucket, sensor_type"
+        return {"bucket": bucket, "items": [dict(row) for row in conn.execute(sql, args)]}
+
+    def recent_alerts(self, conn, params):
+        """Newest alerts first, optionally only one ?level="""
+        limit = parse_limit(params)
+        cursor = parse_cursor(params)
+        sql = "SELECT * FROM alerts WHERE 1=1"
+        args = []
+        if params.get("level"):
+            sql += " AND level = ?"
+            args.append(params["level"])
+        if cursor is not None:
+            sql += " AND id < ?"
+            args.append(cursor)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit + 1)
+        return page(conn.execute(sql, args).fetchall(), limit)
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            self.send_json(200, self.service.query(url.path, params))
+        except LookupError as e:
+            self.send_json(404, json.dumps({"error": str(e)}).encode())
+        except ValueError as e:
+            self.send_json(400, json.dumps({"error": str(e)}).encode())
+        except sqlite3.Error as e:
+            # e.g. locked by a logger that isn't using WAL yet, or no tables
+            self.send_json(503, json.dumps({"error": f"database error: {e}"}).encode())
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[QUERY] {self.address_string()} {format % args}")
+
+def make_server(service, host=QUERY_HOST, port=QUERY_PORT):
+    handler = type("BoundQueryRequestHandler", (QueryRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve aquarium history over HTTP/JSON")
+    parser.add_argument("db_path", nargs="?", default="aquarium_data.db",
+                        help="database to serve, e.g. aquarium_data_tank3.db")
+    parser.add_argument("--host", default=QUERY_HOST)
+    parser.add_argument("--port", type=int, default=QUERY_PORT)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        raise SystemExit(f"[QUERY] {args.db_path} not found - start data_manager.py first")
+
+    service = AquariumQueryService(args.db_path)
+    server = make_server(service, args.host, args.port)
+    print(f"[QUERY] Serving {args.db_path} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[QUERY] Query server stopped")
+    finally:
+        server.server_close()
+        service.pool.close()
+
+if __name__ == "__main__":
+    main()